@@ -12,10 +12,17 @@ Reads reviews from:
 Merges and dedupes into: data.json (SLUview-ready) and data.csv
 """
 
-import json, csv, html, re, sys
+import json, csv, html, mmap, os, re, sys
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List, Dict, Tuple
-from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+
+try:
+    import orjson  # optional: much faster loads/dumps for the multi-MB Apollo blob
+except ImportError:
+    orjson = None
 
 # ---------- config: paths that match your screenshot ----------
 Q4_DIR = Path("../Q4-curl")
@@ -28,65 +35,128 @@ PAGES_DIR = Path("./pages")   # any extra saved pages go here (*.html)
 
 OUT_JSON = Path("data.json")
 OUT_CSV  = Path("data.csv")
+CSV_FIELDS = ["review_id","reviewer","stars","date_local","text"]
+
+# ---------- patterns (compiled once, reused per review) ----------
+_WS_RE = re.compile(r"\s+")
+# raw <script> bodies (group 2); script text ends at the first </script, as in the HTML parser.
+# Comments and text-only elements are matched first and skipped whole, so a <script> written
+# inside <!-- ... --> or a <textarea> is not mistaken for a real one.
+_SCRIPT_RE = re.compile(
+    rb"<!--.*?-->|<(textarea|title|style|xmp)\b[^>]*>.*?</\1\s*>|<script\b[^>]*>(.*?)</script\s*>",
+    re.S | re.I,
+)
+# saved pages are UTF-8; parse bytes without a str copy. huge_tree: the Apollo <script> blob can exceed
+# libxml2's 10 MB text-node limit, and without it the script text silently comes back as None.
+_HTML_PARSER = lxml_html.HTMLParser(encoding="utf-8", huge_tree=True)
+
+_EMPTY: dict = {}  # shared read-only stand-in for missing nested objects; never mutate
 
 # ---------- helpers ----------
 def norm(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "").strip())
+    return _WS_RE.sub(" ", (s or "").strip())
 
 def unesc(s: str) -> str:
     return html.unescape(s or "")
 
-def extract_reviews_from_html(raw_html: str) -> Tuple[List[Dict], Dict[str, str]]:
+_DECODER = json.JSONDecoder()
+
+def load_json(s: str):
+    """Decode a stripped JSON document; without orjson, trailing non-JSON text gives None instead of raising."""
+    if orjson is not None:
+        return orjson.loads(s)
+    obj, end = _DECODER.raw_decode(s)
+    return obj if end == len(s) else None
+
+def dump_json(obj) -> bytes:
+    """Pretty-printed UTF-8 JSON (same layout with or without orjson)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+def collect_from_script(txt: str, reviews: List[Dict], users: Dict[str, str]) -> None:
     """
-    Parse Yelp embedded JSON from <script> tags (handles HTML-escaped and <!-- ... --> wrapped JSON).
-    Returns (reviews, users_by_id)
+    Add the Review / User entries of one <script> body (handles HTML-escaped and <!-- ... --> wrapped JSON).
+    Anything that is not a JSON object is ignored.
     """
-    soup = BeautifulSoup(raw_html, "lxml")
-    reviews, users = [], {}
-
-    for tag in soup.find_all("script"):
-        txt = tag.string if tag.string is not None else tag.get_text()
-        if not txt:
-            continue
-        u = unesc(txt).strip()
-        if u.startswith("<!--") and u.endswith("-->"):
-            u = u[4:-3].strip()
-        # try parse as big object with keys like "Review:...", "User:..."
-        try:
-            data = json.loads(u)
-        except Exception:
-            continue
-        if not isinstance(data, dict):
+    u = unesc(txt).strip()
+    if u.startswith("<!--") and u.endswith("-->"):
+        u = u[4:-3].strip()
+    # cheap gate: only an object/array carrying "__typename" entries can hold reviews
+    if len(u) < 32 or u[0] not in "{[" or u[-1] not in "}]" or "__typename" not in u:
+        return
+    # try parse as big object with keys like "Review:...", "User:..."
+    try:
+        data = load_json(u)
+    except Exception:
+        return
+    if not isinstance(data, dict):
+        return
+
+    for key, val in data.items():
+        if not isinstance(val, dict):
             continue
-
-        for key, val in data.items():
-            if not isinstance(val, dict):
+        t = val.get("__typename")
+        if t == "Review":
+            text_obj = val.get("text") or _EMPTY
+            text = text_obj.get("full") or text_obj.get("plain") or ""
+            if not text.strip():
                 continue
-            t = val.get("__typename")
-            if t == "Review":
-                text = (val.get("text") or {}).get("full") or (val.get("text") or {}).get("plain") or ""
-                if not text.strip():
-                    continue
-                rating = val.get("rating")
-                date_local = (val.get("createdAt") or {}).get("localDateTimeForBusiness") \
-                             or val.get("localizedDate") or ""
-                review_id = val.get("encid") or val.get("reviewId") or key
-                author_ref = ""
-                a = val.get("author")
-                if isinstance(a, dict) and "__ref" in a:
-                    author_ref = a["__ref"].split(":", 1)[-1]
-                reviews.append({
-                    "review_id": review_id,
-                    "author_ref": author_ref,
-                    "stars": rating,
-                    "date_local": date_local,
-                    "text": norm(text),
-                })
-            elif t == "User":
-                uid = key.split(":", 1)[-1]
-                display = unesc(val.get("displayName") or "")
-                if uid and display:
-                    users[uid] = display
+            rating = val.get("rating")
+            date_local = (val.get("createdAt") or _EMPTY).get("localDateTimeForBusiness") \
+                         or val.get("localizedDate") or ""
+            review_id = val.get("encid") or val.get("reviewId") or key
+            author_ref = ""
+            a = val.get("author")
+            if isinstance(a, dict) and "__ref" in a:
+                author_ref = a["__ref"].split(":", 1)[-1]
+            reviews.append({
+                "review_id": review_id,
+                "author_ref": author_ref,
+                "stars": rating,
+                "date_local": date_local,
+                "text": norm(text),
+            })
+        elif t == "User":
+            uid = key.split(":", 1)[-1]
+            display = unesc(val.get("displayName") or "")
+            if uid and display:
+                users[uid] = display
+
+def authors_resolved(reviews: List[Dict], users: Dict[str, str]) -> bool:
+    """True once there are reviews and every review's author_ref has a User entry."""
+    return bool(reviews) and all(not r["author_ref"] or r["author_ref"] in users for r in reviews)
+
+def extract_reviews_from_html(raw_html: bytes) -> Tuple[List[Dict], Dict[str, str]]:
+    """
+    Parse Yelp embedded JSON from <script> tags.
+    raw_html is the page's UTF-8 bytes (or an mmap of the file); only matching script bodies are decoded.
+    Scans the raw HTML for script bodies first; the lxml tree is only built if that finds no reviews.
+    The scan skips comments and <textarea>/<title>/<style>/<xmp> contents but is not a full tokenizer
+    (e.g. an unterminated <!-- is not honoured), so unusual markup can still differ from the parser.
+    Returns (reviews, users_by_id)
+    """
+    reviews, users = [], {}
+    for m in _SCRIPT_RE.finditer(raw_html):
+        body = m.group(2)
+        if body is not None and b"__typename" in body:
+            collect_from_script(body.decode("utf-8", errors="ignore"), reviews, users)
+            if authors_resolved(reviews, users):
+                break  # reviews and their authors are all in hand; skip the remaining scripts
+    if reviews:
+        return reviews, users
+
+    # fallback: let the HTML parser delimit the <script> bodies
+    try:
+        root = lxml_html.document_fromstring(bytes(raw_html), parser=_HTML_PARSER)
+    except etree.ParserError:  # "Document is empty": blank, comment-only or doctype-only pages
+        return [], {}
+    reviews, users = [], {}
+    for tag in root.iter("script"):
+        if tag.text:
+            collect_from_script(tag.text, reviews, users)
+            if authors_resolved(reviews, users):
+                break
     return reviews, users
 
 def attach_reviewers(reviews: List[Dict], users: Dict[str, str]) -> None:
@@ -94,24 +164,39 @@ def attach_reviewers(reviews: List[Dict], users: Dict[str, str]) -> None:
         if "author_ref" in r:
             r["reviewer"] = users.get(r.pop("author_ref", ""), "")
 
+def process_file(fp: Path) -> Tuple[List[Dict], Dict[str, str]]:
+    """Read + parse one saved page (runs in a worker process). Returns (reviews_with_reviewer, users)."""
+    if fp.stat().st_size == 0:  # mmap refuses empty files
+        return [], {}
+    # map the file instead of reading it into a str: the script scan runs on the bytes directly
+    # lxml errors carry an unpicklable error log, so never let one cross the process boundary
+    try:
+        with fp.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            page_reviews, users = extract_reviews_from_html(mm)
+    except etree.LxmlError:
+        return [], {}
+    attach_reviewers(page_reviews, users)
+    return page_reviews, users
+
 def dedupe_and_sort(reviews: List[Dict]) -> List[Dict]:
-    seen, out = set(), []
+    # dicts keep insertion order; setdefault keeps the first review seen per key.
+    # One pass also fills in date_local so the sort can use a C-level itemgetter.
+    keyed: Dict[str, Dict] = {}
     for r in reviews:
         if not r.get("text"):
             continue
-        rid = r.get("review_id") or (r.get("reviewer","") + "|" + r.get("date_local",""))
-        if rid in seen:
-            continue
-        seen.add(rid)
-        out.append(r)
-    out.sort(key=lambda x: x.get("date_local",""), reverse=True)
+        date_local = r.setdefault("date_local", "")
+        keyed.setdefault(r.get("review_id") or (r.get("reviewer","") + "|" + date_local), r)
+    out = list(keyed.values())
+    out.sort(key=itemgetter("date_local"), reverse=True)
     return out
 
 def write_outputs(reviews: List[Dict]) -> None:
-    OUT_JSON.write_text(json.dumps({"count": len(reviews), "reviews": reviews}, ensure_ascii=False, indent=2), encoding="utf-8")
-    with OUT_CSV.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=["review_id","reviewer","stars","date_local","text"])
-        w.writeheader(); w.writerows(reviews)
+    OUT_JSON.write_bytes(dump_json({"count": len(reviews), "reviews": reviews}))
+    with OUT_CSV.open("w", newline="", encoding="utf-8", buffering=1 << 20) as f:  # 1 MiB buffer, one bulk writerows
+        w = csv.writer(f)
+        w.writerow(CSV_FIELDS)
+        w.writerows([tuple(r.get(k, "") for k in CSV_FIELDS) for r in reviews])
 
 def main():
     # Build the list of files to parse, in this order
@@ -131,10 +216,11 @@ def main():
     all_reviews: List[Dict] = []
     user_map: Dict[str, str] = {}
 
-    for fp in files:
-        raw = fp.read_text(encoding="utf-8", errors="ignore")
-        page_reviews, users = extract_reviews_from_html(raw)
-        attach_reviewers(page_reviews, users)
+    # pages are independent and parsing is CPU-bound, so spread them over cores
+    with ProcessPoolExecutor(max_workers=min(len(files), os.cpu_count() or 1)) as ex:
+        results = list(ex.map(process_file, files))
+
+    for fp, (page_reviews, users) in zip(files, results):
         all_reviews.extend(page_reviews)
         # keep a global user cache in case you need it later
         user_map.update(users)
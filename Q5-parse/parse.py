@@ -10,31 +10,86 @@ Plus business fields on each row: business_name, overall_rating, total_review_co
 """
 
 import sys, re, json, csv, html
+from operator import itemgetter
 from pathlib import Path
 
-from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
+
+try:
+    import orjson  # optional: much faster loads/dumps for the multi-MB Apollo blob
+except ImportError:
+    orjson = None
 
 # ---------- config ----------
 DEFAULT_INPUT = Path("../Q4-curl/listing_fr.html")  # <- matches your screenshot
 JSON_OUT = Path("parsed.json")
 CSV_OUT  = Path("parsed.csv")
+BUSINESS_TYPES = frozenset(("LocalBusiness", "Restaurant", "Organization"))  # JSON-LD @type values we accept
+
+# ---------- patterns (compiled once, reused per review / DOM node) ----------
+_WS_RE = re.compile(r"\s+")
+_STAR_LABEL_RE = re.compile(r"(star rating|étoile)", re.I)
+_NUM_RE = re.compile(r"([0-9]+(?:[.,][0-9]+)?)")
+# a year or a French month name, in one alternation so each text is scanned once
+_DATE_RE = re.compile(r"\b20\d{2}\b|janvier|février|mars|avril|mai|juin|juillet|août|septembre|octobre|novembre|décembre", re.I)
+_USER_HREF_RE = re.compile(r"/user_details", re.I)
+
+# saved pages are UTF-8; parse bytes without a str copy. huge_tree: the Apollo <script> blob can exceed
+# libxml2's 10 MB text-node limit, and without it the script text silently comes back as None.
+_HTML_PARSER = lxml_html.HTMLParser(encoding="utf-8", huge_tree=True)
+
+_EMPTY: dict = {}  # shared read-only stand-in for missing nested objects; never mutate
 
 # ---------- helpers ----------
 def norm(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "").strip())
+    return _WS_RE.sub(" ", (s or "").strip())
 
 def unesc(s: str) -> str:
     return html.unescape(s or "")
 
-def extract_business_info(soup: BeautifulSoup) -> dict:
+_DECODER = json.JSONDecoder()
+
+def load_json(s: str):
+    """Decode a stripped JSON document; without orjson, trailing non-JSON text gives None instead of raising."""
+    if orjson is not None:
+        return orjson.loads(s)
+    obj, end = _DECODER.raw_decode(s)
+    return obj if end == len(s) else None
+
+def parse_html(raw: bytes) -> lxml_html.HtmlElement:
+    """Build the lxml tree once per page from its UTF-8 bytes (a page with no elements yields an empty <html>)."""
+    try:
+        return lxml_html.document_fromstring(raw, parser=_HTML_PARSER)
+    except etree.ParserError:  # "Document is empty": blank, comment-only or doctype-only pages
+        return lxml_html.Element("html")
+
+def read_page(path: Path) -> lxml_html.HtmlElement:
+    """Parse the saved page straight from its bytes (no decoded str copy)."""
+    return parse_html(path.read_bytes())
+
+def text_of(el: lxml_html.HtmlElement) -> str:
+    """lxml equivalent of BeautifulSoup's get_text(" ", strip=True): skips script/style/template text."""
+    parts = (p.strip() for p in el.xpath(".//text()[not(parent::script or parent::style or ancestor::template)]"))
+    return " ".join(p for p in parts if p)
+
+def dump_json(obj) -> bytes:
+    """Pretty-printed UTF-8 JSON (same layout with or without orjson)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+def extract_business_info(root: lxml_html.HtmlElement) -> dict:
     """Prefer JSON-LD; fall back to page header."""
     info = {"name":"", "overall_rating":"", "total_review_count":"", "priceRange":""}
-    for tag in soup.find_all("script", type="application/ld+json"):
+    for tag in root.xpath('//script[@type="application/ld+json"]'):
+        content = tag.text
+        if not content or '"@type"' not in content:
+            continue
         try:
-            data = json.loads(tag.string)
+            data = json.loads(content)
         except Exception:
             continue
-        if isinstance(data, dict) and data.get("@type") in {"LocalBusiness","Restaurant","Organization"}:
+        if isinstance(data, dict) and data.get("@type") in BUSINESS_TYPES:
             info["name"] = info["name"] or data.get("name","") or ""
             agg = data.get("aggregateRating") or {}
             if isinstance(agg, dict):
@@ -42,26 +97,30 @@ def extract_business_info(soup: BeautifulSoup) -> dict:
                 rc = agg.get("reviewCount")
                 info["overall_rating"] = info["overall_rating"] or (str(rv) if rv is not None else "")
                 info["total_review_count"] = info["total_review_count"] or (str(rc) if rc is not None else "")
-            pr = data.get("priceRange")
-            if pr:
-                info["priceRange"] = pr
+            info["priceRange"] = info["priceRange"] or data.get("priceRange") or ""
+            if all(info.values()):
+                return info
     if not info["name"]:
-        h = soup.find(["h1","h2"])
-        if h: info["name"] = norm(h.get_text(" ", strip=True))
+        h = root.xpath("(//h1|//h2)[1]")
+        if h: info["name"] = norm(text_of(h[0]))
     return info
 
-def parse_embedded_json(html_text: str) -> tuple[list[dict], dict]:
+def authors_resolved(reviews: list[dict], users: dict) -> bool:
+    """True once there are reviews and every review's author_ref has a User entry."""
+    return bool(reviews) and all(not r["author_ref"] or r["author_ref"] in users for r in reviews)
+
+def parse_embedded_json(root: lxml_html.HtmlElement) -> tuple[list[dict], dict]:
     """
     Parse Yelp's embedded Apollo-style JSON from <script> tags.
+    Takes the already-parsed page so the HTML is only parsed once.
     Handles HTML-escaped JSON and <!-- ... --> wrappers.
     Returns (reviews, users_by_id).
     """
-    soup = BeautifulSoup(html_text, "lxml")
     reviews, users = [], {}
 
     # collect script contents
-    for tag in soup.find_all("script"):
-        content = tag.string if tag.string is not None else tag.get_text()
+    for tag in root.iter("script"):
+        content = tag.text
         if not content:
             continue
         u = unesc(content).strip()
@@ -70,10 +129,15 @@ def parse_embedded_json(html_text: str) -> tuple[list[dict], dict]:
         if u.startswith("<!--") and u.endswith("-->"):
             u = u[4:-3].strip()
 
+        # Cheap gate before parsing: skip analytics/JS bundles that
+        # cannot be an Apollo cache object carrying "__typename" entries.
+        if len(u) < 32 or u[0] not in "{[" or u[-1] not in "}]" or "__typename" not in u:
+            continue
+
         # Try parse as JSON object with many cache entries:
         # {"Review:xxxx": {...}, "User:yyyy": {...}, ...}
         try:
-            data = json.loads(u)
+            data = load_json(u)
         except Exception:
             # Not a pure JSON blob; skip
             continue
@@ -88,9 +152,10 @@ def parse_embedded_json(html_text: str) -> tuple[list[dict], dict]:
             t = val.get("__typename")
             if t == "Review":
                 # Prefer text.full, fallback to text.plain
-                text = (val.get("text") or {}).get("full") or (val.get("text") or {}).get("plain") or ""
+                text_obj = val.get("text") or _EMPTY
+                text = norm(text_obj.get("full") or text_obj.get("plain") or "")
                 rating = val.get("rating")
-                date_local = (val.get("createdAt") or {}).get("localDateTimeForBusiness") or val.get("localizedDate") or ""
+                date_local = (val.get("createdAt") or _EMPTY).get("localDateTimeForBusiness") or val.get("localizedDate") or ""
                 review_id = val.get("encid") or val.get("reviewId") or key
 
                 author_ref = ""
@@ -98,13 +163,13 @@ def parse_embedded_json(html_text: str) -> tuple[list[dict], dict]:
                 if isinstance(a, dict) and "__ref" in a:
                     author_ref = a["__ref"].split(":", 1)[-1]
 
-                if text and norm(text):
+                if text:
                     reviews.append({
                         "review_id": review_id,
                         "author_ref": author_ref,
                         "stars": rating,
                         "date_local": date_local,
-                        "text": norm(text),
+                        "text": text,
                     })
 
             elif t == "User":
@@ -113,62 +178,75 @@ def parse_embedded_json(html_text: str) -> tuple[list[dict], dict]:
                 if uid and display:
                     users[uid] = display
 
+        # Stop once the reviews and all their authors are found (Yelp normally keeps
+        # both in one Apollo cache blob, but authors may come in a later script).
+        if authors_resolved(reviews, users):
+            break
+
     return reviews, users
 
-def dom_fallback_extract(soup: BeautifulSoup) -> list[dict]:
+def dom_fallback_extract(root: lxml_html.HtmlElement) -> list[dict]:
     """
     Very light DOM fallback for mobile/AMP pages that contain inline review cards.
     This only runs if the embedded JSON path yielded 0 results.
     """
     out = []
     # Look for containers that have 'star rating' (English) or 'étoile' (French) and a paragraph.
-    def looks_like_card(tag):
-        try:
-            has_star = tag.find(attrs={"aria-label": re.compile(r"(star rating|étoile)", re.I)}) is not None
-            has_p = tag.find("p") is not None
-            return has_star and has_p
-        except Exception:
-            return False
+    # Find the star labels once, then walk up to every card ancestor instead of
+    # searching each candidate's subtree; the first label in document order wins.
+    star_of = {}
+    for el in root.xpath("//*[@aria-label]"):
+        if not _STAR_LABEL_RE.search(el.get("aria-label")):
+            continue
+        for anc in el.iterancestors("article", "section", "div", "li"):
+            if anc in star_of:
+                break  # this ancestor and everything above it already has an earlier label
+            star_of[anc] = el
+
+    for t in root.iter("article", "section", "div", "li"):
+        star_el = star_of.get(t)
+        if star_el is None:
+            continue
 
-    for t in soup.find_all(["article","section","div","li"]):
-        if not looks_like_card(t):
+        # text: longest paragraph, normalized once it is picked
+        # (the paragraph scan doubles as the "has a <p>" check)
+        best = ""
+        for p in t.iterdescendants("p"):
+            raw = text_of(p)
+            if len(raw) > len(best):
+                best = raw
+        text = norm(best)
+        if not text:
             continue
+
         # stars
         stars = ""
-        star_el = t.find(attrs={"aria-label": re.compile(r"(star rating|étoile)", re.I)})
-        if star_el:
-            label = star_el.get("aria-label", "") or star_el.get_text(" ", strip=True)
-            m = re.search(r"([0-9]+(?:[.,][0-9]+)?)", label)
-            if m:
-                stars = m.group(1).replace(",", ".")
+        label = star_el.get("aria-label", "") or text_of(star_el)
+        m = _NUM_RE.search(label)
+        if m:
+            stars = m.group(1).replace(",", ".")
 
         # date (loose)
         date = ""
-        for d in t.find_all(["time","span","div"]):
-            s = d.get_text(" ", strip=True)
-            if re.search(r"\b20\d{2}\b", s) or re.search(r"(janvier|février|mars|avril|mai|juin|juillet|août|septembre|octobre|novembre|décembre)", s, re.I):
+        for d in t.iterdescendants("time", "span", "div"):
+            s = text_of(d)
+            if _DATE_RE.search(s):
                 date = s
                 break
 
         # reviewer
         reviewer = ""
-        a = t.find("a", href=re.compile(r"/user_details", re.I))
-        if a and a.get_text(strip=True):
-            reviewer = norm(a.get_text(" ", strip=True))
-
-        # text
-        ps = [norm(p.get_text(" ", strip=True)) for p in t.find_all("p")]
-        ps = [p for p in ps if p]
-        text = max(ps, key=len) if ps else ""
-
-        if text:
-            out.append({
-                "review_id": "",
-                "reviewer": reviewer,
-                "stars": stars,
-                "date_local": date,
-                "text": text
-            })
+        a = next((x for x in t.iterdescendants("a") if _USER_HREF_RE.search(x.get("href", ""))), None)
+        if a is not None:
+            reviewer = norm(text_of(a))
+
+        out.append({
+            "review_id": "",
+            "reviewer": reviewer,
+            "stars": stars,
+            "date_local": date,
+            "text": text
+        })
 
     return out
 
@@ -177,44 +255,35 @@ def main():
     if not in_path.exists():
         sys.exit(f"Input file not found: {in_path}")
 
-    raw = in_path.read_text(encoding="utf-8", errors="ignore")
-    soup = BeautifulSoup(raw, "lxml")
+    root = read_page(in_path)
 
     # 1) Embedded JSON path
-    reviews, users = parse_embedded_json(raw)
+    reviews, users = parse_embedded_json(root)
     for r in reviews:
         r["reviewer"] = users.get(r.pop("author_ref", ""), "")
 
     # 2) DOM fallback (only if needed)
     if not reviews:
-        reviews = dom_fallback_extract(soup)
+        reviews = dom_fallback_extract(root)
 
     # Business info for extra fields
-    biz = extract_business_info(soup)
+    biz = extract_business_info(root)
 
     # Sort newest first if dates look sortable
-    reviews.sort(key=lambda r: r.get("date_local",""), reverse=True)
+    reviews.sort(key=itemgetter("date_local"), reverse=True)
 
     # Save JSON
-    JSON_OUT.write_text(
-        json.dumps({"business": biz, "count": len(reviews), "reviews": reviews}, ensure_ascii=False, indent=2),
-        encoding="utf-8"
-    )
+    JSON_OUT.write_bytes(dump_json({"business": biz, "count": len(reviews), "reviews": reviews}))
 
     # Save CSV
-    fields = ["review_id","reviewer","stars","date_local","text","business_name","overall_rating","total_review_count","priceRange"]
-    with CSV_OUT.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fields)
-        w.writeheader()
-        for r in reviews:
-            row = {
-                **r,
-                "business_name": biz.get("name",""),
-                "overall_rating": biz.get("overall_rating",""),
-                "total_review_count": biz.get("total_review_count",""),
-                "priceRange": biz.get("priceRange",""),
-            }
-            w.writerow(row)
+    review_fields = ["review_id","reviewer","stars","date_local","text"]
+    fields = review_fields + ["business_name","overall_rating","total_review_count","priceRange"]
+    # business columns are the same on every row, so build them once
+    biz_tuple = (biz.get("name",""), biz.get("overall_rating",""), biz.get("total_review_count",""), biz.get("priceRange",""))
+    with CSV_OUT.open("w", newline="", encoding="utf-8", buffering=1 << 20) as f:  # 1 MiB buffer, one bulk writerows
+        w = csv.writer(f)
+        w.writerow(fields)
+        w.writerows([(*(r.get(k, "") for k in review_fields), *biz_tuple) for r in reviews])
 
     print(f"Parsed {len(reviews)} reviews → {CSV_OUT}, {JSON_OUT}")
     if len(reviews) < 5: